@@ -4,50 +4,124 @@ Application code
 """
 
 import copy
+import gzip
+import json
 import math
-import os
+from functools import lru_cache, partial
 import dash
+import flask
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objs as go
+import plotly.io as pio
+import plotly.utils
 from dash.dependencies import Input, Output
 from plotly.subplots import make_subplots
 import luts
-from gui import layout, path_prefix
+from gui import layout, path_prefix, header_html, footer_html
 
 
+# Brotli is used to precompress the layout if available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Serialize figures with orjson when it's installed. The JSON engine
+# setting only exists in newer plotly releases (which Dash also uses
+# to encode callback responses), so fall back to the default otherwise.
+try:
+    import orjson  # pylint: disable=unused-import
+
+    pio.json.config.default_engine = "orjson"
+except (ImportError, AttributeError):
+    pass
+
 # Read data blobs and other items used from env
 roses = luts.roses
 calms = pd.read_pickle("data/calms.pickle")
 exceedance = pd.read_pickle("data/crosswind_exceedance.pickle")
 mean_wep = pd.read_pickle("data/mean_wep.pickle")
 
+# Figures only depend on the callback inputs and the data above,
+# which is loaded once at startup, so callback results are memoized
+# per process. This bounds the number of figures kept per callback.
+figure_cache_size = 256
+
 # separate rose data for different sections
 sxs_roses = roses[roses["decade"] != "none"]
 roses = roses[roses["decade"] == "none"]
 
+
+class StaticLayoutDash(dash.Dash):
+    """
+    Dash app for a layout that never changes after startup.
+    The layout is encoded to JSON and compressed on the first
+    request for it, and the same bytes are served afterwards,
+    instead of re-encoding and re-compressing the whole component
+    tree on every page load.
+    """
+
+    layout_json = None
+    layout_compressed = None
+
+    def serve_layout(self):
+        if self.layout_json is None:
+            self.layout_json = json.dumps(
+                self._layout_value(), cls=plotly.utils.PlotlyJSONEncoder
+            ).encode("utf-8")
+            self.layout_compressed = {"gzip": gzip.compress(self.layout_json, 9)}
+            if brotli is not None:
+                self.layout_compressed["br"] = brotli.compress(
+                    self.layout_json, quality=11
+                )
+
+        # Prefer brotli over gzip, honouring the client's q-values.
+        # Responses with Content-Encoding set are passed through by Flask-Compress
+        encoding = flask.request.accept_encodings.best_match(
+            [enc for enc in ("br", "gzip") if enc in self.layout_compressed]
+        )
+        if encoding is not None:
+            response = flask.Response(
+                self.layout_compressed[encoding], mimetype="application/json"
+            )
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = flask.Response(self.layout_json, mimetype="application/json")
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
 # We set the requests_pathname_prefix to enable
 # custom URLs.
 # https://community.plot.ly/t/dash-error-loading-layout/8139/6
-app = dash.Dash(__name__, requests_pathname_prefix=path_prefix)
+app = StaticLayoutDash(__name__, requests_pathname_prefix=path_prefix)
 
 # AWS Elastic Beanstalk looks for application by default,
 # if this variable (application) isn't set you will get a WSGI error.
 application = app.server
-app.index_string = f"""
-<!DOCTYPE html>
-<html>
-    <head>
+
+# Google Analytics is loaded at the end of the body so it doesn't
+# hold up parsing the page or loading the Dash scripts.
+gtag_id = luts.env_config["gtag_id"]
+gtag_html = ""
+if gtag_id:
+    gtag_html = f"""
         <!-- Global site tag (gtag.js) - Google Analytics -->
-        <script async src="https://www.googletagmanager.com/gtag/js?id=G-1J75Z1N5FP"></script>
+        <script async src="https://www.googletagmanager.com/gtag/js?id={gtag_id}"></script>
         <script>
           window.dataLayer = window.dataLayer || [];
           function gtag(){{dataLayer.push(arguments);}}
           gtag('js', new Date());
 
-          gtag('config', 'G-1J75Z1N5FP');
-        </script>
+          gtag('config', '{gtag_id}');
+        </script>"""
+
+app.index_string = f"""
+<!DOCTYPE html>
+<html>
+    <head>
         {{%metas%}}
         <title>{{%title%}}</title>
         <meta charset="utf-8"/>
@@ -81,12 +155,15 @@ app.index_string = f"""
         {{%css%}}
     </head>
     <body>
+        {header_html}
         {{%app_entry%}}
+        {footer_html}
         <footer>
             {{%config%}}
             {{%scripts%}}
             {{%renderer%}}
         </footer>
+        {gtag_html}
     </body>
 </html>
 """
@@ -112,6 +189,7 @@ def update_place_dropdown(selected_on_map):
 @app.callback(
     Output("map", "figure"), Input("airports-dropdown", "value"),
 )
+@lru_cache(maxsize=figure_cache_size)
 def update_selected_airport_on_map(sid):
     """ Draw a second trace on the map with one community highlighted. """
 
@@ -124,7 +202,7 @@ def update_selected_airport_on_map(sid):
                 mode="markers",
                 marker={"size": 20, "color": "rgb(207, 38, 47)"},
                 line={"color": "rgb(0, 0, 0)", "width": 2},
-                text=luts.map_data.loc[sid]["real_name"],
+                text=luts.station_names[sid],
                 hoverinfo="text",
             ),
         ],
@@ -221,11 +299,12 @@ def add_runway_traces(sid, fig, height):
     Output("exceedance_plot", "figure"),
     [Input("airports-dropdown", "value"), Input("units_selector", "value")],
 )
+@lru_cache(maxsize=figure_cache_size)
 def update_exceedance_plot(sid, units):
     """Plot line chart of allowable crosswind threshold exceedance"""
     df = exceedance.loc[exceedance["sid"] == sid]
 
-    station_name = luts.map_data.loc[sid]["real_name"]
+    station_name = luts.station_names[sid]
     start_year = max(pd.to_datetime(luts.map_data.loc[sid]["begints"]).year, 1980)
     title = f"Runway direction vs. allowable crosswind exceedance, {station_name}, {start_year}-present"
 
@@ -276,15 +355,35 @@ def update_exceedance_plot(sid, units):
     return fig
 
 
+@lru_cache(maxsize=figure_cache_size)
+def get_fig_config(filename):
+    """
+    Common figure config with the given download filename.
+    Built once per filename; only the download options are copied,
+    the rest of the config is shared with luts.fig_configs.
+    """
+    return {
+        **luts.fig_configs,
+        "toImageButtonOptions": {
+            **luts.fig_configs["toImageButtonOptions"],
+            "filename": filename,
+        },
+    }
+
+
 @app.callback(Output("exceedance_plot", "config"), Input("airports-dropdown", "value"))
 def update_exceedance_plot_config(sid):
-    config = copy.deepcopy(luts.fig_configs)
-    config["toImageButtonOptions"]["filename"] = f"{sid}_crosswind_exceedance"
+    return get_fig_config(f"{sid}_crosswind_exceedance")
 
-    return config
 
+def get_speed_range_name(sr, units):
+    """Return the legend name for a speed range in the chosen units"""
+    if units in ["kts", "m/s"]:
+        return f"{luts.speed_units[units][sr]} {units}"
+    return sr + " mph"
 
-def get_rose_traces(d, traces, units, showlegend=False, lines=False):
+
+def get_rose_traces(d, traces, units, showlegend=False):
     """
     Get all traces for a wind rose, given the data chunk.
     Month is used to tie the subplot to the formatting
@@ -293,33 +392,17 @@ def get_rose_traces(d, traces, units, showlegend=False, lines=False):
 
     # Directly mutate the `traces` array.
     for sr, sr_info in luts.speed_ranges.items():
-        if units in ["kts", "m/s"]:
-            name = f"{luts.speed_units[units][sr]} {units}"
-        else:
-            name = sr + " mph"
         dcr = d.loc[(d["speed_range"] == sr)]
-        r_list = dcr["frequency"].tolist()
-        theta_list = list(pd.to_numeric(dcr["direction_class"]) * 10)
         props = dict(
-            r=r_list,
-            theta=theta_list,
-            name=name,
+            r=dcr["frequency"].tolist(),
+            theta=list(pd.to_numeric(dcr["direction_class"]) * 10),
+            name=get_speed_range_name(sr, units),
             hovertemplate="%{r} %{fullData.name} winds from %{theta}<extra></extra>",
             marker_color=sr_info["color"],
             showlegend=showlegend,
             legendgroup="legend",
         )
-        if lines:
-            props["mode"] = "lines"
-            # append first item of each to close the lines
-            props["r"].append(r_list[0])
-            props["theta"].append(theta_list[0])
-            props[
-                "hovertemplate"
-            ] = "%{r:.2f}% change in %{fullData.name}<br>winds from %{theta}<extra></extra>"
-            traces.append(go.Scatterpolar(props))
-        else:
-            traces.append(go.Barpolar(props))
+        traces.append(go.Barpolar(props))
 
     # Compute the maximum extent of any particular
     # petal on the wind rose.
@@ -328,6 +411,90 @@ def get_rose_traces(d, traces, units, showlegend=False, lines=False):
     return max_petal
 
 
+def get_diff_rose_traces(diff_dict, units):
+    """
+    Get the line traces for the change in winds rose, given the
+    frequency differences prepared by get_comparison_data.
+    """
+    traces = []
+    for sr, sr_info in luts.speed_ranges.items():
+        r_list = diff_dict[sr]["r"]
+        theta_list = diff_dict[sr]["theta"]
+        traces.append(
+            go.Scatterpolar(
+                # append first item of each to close the lines
+                r=r_list + r_list[:1],
+                theta=theta_list + theta_list[:1],
+                mode="lines",
+                name=get_speed_range_name(sr, units),
+                hovertemplate="%{r:.2f}% change in %{fullData.name}<br>winds from %{theta}<extra></extra>",
+                marker_color=sr_info["color"],
+                showlegend=True,
+                legendgroup="legend",
+            )
+        )
+
+    return traces
+
+
+# Layout pieces shared by the single wind rose charts (summary rose
+# and change in winds). These are built once and treated as read-only;
+# make_rose_layout fills in only the parts that vary per callback.
+rose_layout_base = {
+    "height": 700,
+    "font": dict(family="Open Sans", size=14),
+    "margin": {"l": 0, "r": 0, "b": 20, "t": 75},
+    "legend": {"orientation": "h", "x": 0, "y": 1},
+    "paper_bgcolor": luts.background_color,
+}
+
+rose_polar_base = {
+    "legend": {"orientation": "h"},
+    "angularaxis": {
+        "rotation": 90,
+        "direction": "clockwise",
+        "tickmode": "array",
+        "tickvals": [0, 45, 90, 135, 180, 225, 270, 315],
+        "ticks": "",  # hide tick marks
+        "ticktext": ["N", "NE", "E", "SE", "S", "SW", "W", "NW"],
+        "tickfont": {"color": "#444"},
+        "showline": False,  # no boundary circles
+        "color": "#888",  # set most colors to #888
+        "gridcolor": "#efefef",
+    },
+    "radialaxis": {
+        "color": "#888",
+        "gridcolor": "#efefef",
+        "ticksuffix": "%",
+        "showticksuffix": "last",
+        "tickcolor": "rgba(0, 0, 0, 0)",
+        "tick0": 0,
+        "ticklen": 10,
+        "showline": False,  # hide the dark axis line
+        "tickfont": {"color": "#444"},
+    },
+}
+
+
+def make_rose_layout(title_text, dtick, hole, annotations=None, shapes=None):
+    """
+    Return a layout dict for a single wind rose chart,
+    using the shared base layout and polar properties.
+    """
+    rose_layout = dict(rose_layout_base)
+    rose_layout["title"] = {"text": title_text, "font": {"size": 18}}
+    polar = dict(rose_polar_base)
+    polar["radialaxis"] = {**rose_polar_base["radialaxis"], "dtick": dtick}
+    polar["hole"] = hole
+    rose_layout["polar"] = polar
+    if annotations is not None:
+        rose_layout["annotations"] = annotations
+    if shapes is not None:
+        rose_layout["shapes"] = shapes
+
+    return rose_layout
+
+
 @app.callback(
     Output("rose", "figure"),
     [
@@ -336,9 +503,10 @@ def get_rose_traces(d, traces, units, showlegend=False, lines=False):
         Input("rose-pcount", "value"),
     ],
 )
+@lru_cache(maxsize=figure_cache_size)
 def update_rose(sid, units, pcount):
     """Generate cumulative wind rose for selected airport"""
-    station_name = luts.map_data.loc[sid]["real_name"]
+    station_name = luts.station_names[sid]
     station_rose = roses.loc[
         (roses["sid"] == sid) & (roses["pcount"] == pcount) & (roses["month"] == 0)
     ]
@@ -354,16 +522,11 @@ def update_rose(sid, units, pcount):
     calm = int(round(c["percent"].values[0]))
 
     start_year = max(pd.to_datetime(luts.map_data.loc[sid]["begints"]).year, 1980)
-    rose_layout = {
-        "title": dict(
-            text=f"Wind Speed/Direction Distribution for {station_name}, {start_year}-present",
-            font=dict(size=18),
-        ),
-        "height": 700,
-        "font": dict(family="Open Sans", size=14),
-        "margin": {"l": 0, "r": 0, "b": 20, "t": 75},
-        "legend": {"orientation": "h", "x": 0, "y": 1},
-        "annotations": [
+    rose_layout = make_rose_layout(
+        f"Wind Speed/Direction Distribution for {station_name}, {start_year}-present",
+        {8: 6, 16: 4, 36: 3}[pcount],
+        calm / 100,
+        annotations=[
             {
                 "x": 0.5,
                 "y": 0.5,
@@ -373,46 +536,14 @@ def update_rose(sid, units, pcount):
                 "yref": "paper",
             }
         ],
-        "polar": {
-            "legend": {"orientation": "h"},
-            "angularaxis": {
-                "rotation": 90,
-                "direction": "clockwise",
-                "tickmode": "array",
-                "tickvals": [0, 45, 90, 135, 180, 225, 270, 315],
-                "ticks": "",  # hide tick marks
-                "ticktext": ["N", "NE", "E", "SE", "S", "SW", "W", "NW"],
-                "tickfont": {"color": "#444"},
-                "showline": False,  # no boundary circles
-                "color": "#888",  # set most colors to #888
-                "gridcolor": "#efefef",
-            },
-            "radialaxis": {
-                "color": "#888",
-                "gridcolor": "#efefef",
-                "ticksuffix": "%",
-                "showticksuffix": "last",
-                "tickcolor": "rgba(0, 0, 0, 0)",
-                "tick0": 0,
-                "dtick": {8:6, 16:4, 36:3}[pcount],
-                "ticklen": 10,
-                "showline": False,  # hide the dark axis line
-                "tickfont": {"color": "#444"},
-            },
-            "hole": calm / 100,
-        },
-        "paper_bgcolor": luts.background_color,
-    }
+    )
 
     return {"layout": rose_layout, "data": traces}
 
 
 @app.callback(Output("rose", "config"), Input("airports-dropdown", "value"))
 def update_rose_config(sid):
-    config = copy.deepcopy(luts.fig_configs)
-    config["toImageButtonOptions"]["filename"] = f"{sid}_summary_wind_rose"
-
-    return config
+    return get_fig_config(f"{sid}_summary_wind_rose")
 
 
 def get_rose_calm_month_annotations(titles, calm):
@@ -447,11 +578,12 @@ def get_rose_calm_month_annotations(titles, calm):
         Input("rose-pcount", "value"),
     ],
 )
+@lru_cache(maxsize=figure_cache_size)
 def update_rose_monthly(sid, units, pcount):
     """
     Create a grid of subplots for all monthly wind roses.
     """
-    station_name = luts.map_data.loc[sid]["real_name"]
+    station_name = luts.station_names[sid]
     station_rose = roses.loc[(roses["sid"] == sid) & (roses["pcount"] == pcount)]
 
     # t = top margin in % of figure.
@@ -470,19 +602,19 @@ def update_rose_monthly(sid, units, pcount):
         subplot_titles=list(luts.months.values()),
     )
 
-    max_axes = pd.DataFrame()
+    max_petals = []
     month = 1
     for i in range(1, 5):
         for j in range(1, 4):
             if_show_legend = month == 1  # only show the first legend
             traces = []
             d = station_rose[station_rose["month"] == month]
-            max_axes = max_axes.append(
-                get_rose_traces(d, traces, units, if_show_legend), ignore_index=True
-            )
+            max_petals.append(get_rose_traces(d, traces, units, if_show_legend))
             for trace in traces:
                 fig.add_trace(trace, row=i, col=j)
             month += 1
+    # one row per subplot, built at once instead of appended per subplot
+    max_axes = pd.DataFrame(max_petals)
 
     # Determine maximum r-axis and r-step.
     # Adding one and using floor(/2.5) was the
@@ -576,18 +708,16 @@ def update_rose_monthly(sid, units, pcount):
 
 @app.callback(Output("rose_monthly", "config"), Input("airports-dropdown", "value"))
 def update_monthly_rose_config(sid):
-    config = copy.deepcopy(luts.fig_configs)
-    config["toImageButtonOptions"]["filename"] = f"{sid}_monthly_wind_rose"
-
-    return config
+    return get_fig_config(f"{sid}_monthly_wind_rose")
 
 
 @app.callback(Output("wep_box", "figure"), [Input("airports-dropdown", "value")])
+@lru_cache(maxsize=figure_cache_size)
 def update_box_plots(sid):
     """ Generate box plot for monthly averages """
 
     d = mean_wep.loc[(mean_wep["sid"] == sid)]
-    station_name = luts.map_data.loc[sid]["real_name"]
+    station_name = luts.station_names[sid]
     start_year = max(pd.to_datetime(luts.map_data.loc[sid]["begints"]).year, 1980)
 
     return go.Figure(
@@ -631,11 +761,8 @@ def update_box_plots(sid):
 
 
 @app.callback(Output("wep_box", "config"), Input("airports-dropdown", "value"))
-def update_monthly_rose_config(sid):
-    config = luts.fig_configs
-    config["toImageButtonOptions"]["filename"] = f"{sid}_wind_energy_potential_boxplots"
-
-    return config
+def update_box_plots_config(sid):
+    return get_fig_config(f"{sid}_wind_energy_potential_boxplots")
 
 
 # This function should return the filtered data,
@@ -644,6 +771,7 @@ def update_monthly_rose_config(sid):
     Output("comparison-rose-data", "data"),
     [Input("airports-dropdown", "value"), Input("rose-pcount", "value")],
 )
+@lru_cache(maxsize=figure_cache_size)
 def get_comparison_data(sid, pcount):
     """Prep data that will be used in the side-by-side roses and
     the difference polar line chart
@@ -652,7 +780,7 @@ def get_comparison_data(sid, pcount):
     We need the app to hide sxs and diff rose charts if there isn't enough data.
     Use an invisible data container to do that.
     """
-    station_name = luts.map_data.loc[sid]["real_name"]
+    station_name = luts.station_names[sid]
     station_roses = sxs_roses.loc[
         (sxs_roses["sid"] == sid) & (sxs_roses["pcount"] == pcount)
     ]
@@ -706,8 +834,22 @@ def get_comparison_data(sid, pcount):
     station_calms = station_calms.reset_index()
     station_calms = station_calms.assign(percent=station_calms["percent"] / 100)
 
+    # compute frequency differences between the decades here, split by
+    # speed range, so the change in winds chart can use them directly
+    old_rose, new_rose = data_list
+    freq_diffs = new_rose["frequency"].values - old_rose["frequency"].values
+    thetas = pd.to_numeric(old_rose["direction_class"]).values * 10
+    diff_dict = {}
+    for sr in luts.speed_ranges:
+        sr_mask = (old_rose["speed_range"] == sr).values
+        diff_dict[sr] = {
+            "r": freq_diffs[sr_mask].tolist(),
+            "theta": thetas[sr_mask].tolist(),
+        }
+
     return {
         "data_list": [df.to_dict() for df in data_list],
+        "diff_dict": diff_dict,
         "target_decades": target_decades,
         "sid": sid,
         "calms_dict": station_calms.to_dict(),
@@ -777,7 +919,7 @@ def update_rose_sxs(rose_dict, units):
         ),
     )
 
-    station_name = luts.map_data.loc[rose_dict["sid"]]["real_name"]
+    station_name = luts.station_names[rose_dict["sid"]]
 
     rose_layout = {
         "title": dict(
@@ -808,13 +950,12 @@ def update_rose_sxs(rose_dict, units):
     fig = make_subplots(**subplot_args)
 
     data_list = [pd.DataFrame(df_dict) for df_dict in rose_dict["data_list"]]
-    max_axes = pd.DataFrame()
+    max_petals = []
     for df, show_legend, i in zip(data_list, [True, False], [1, 2]):
         traces = []
-        max_axes = max_axes.append(
-            get_rose_traces(df, traces, units, show_legend), ignore_index=True
-        )
+        max_petals.append(get_rose_traces(df, traces, units, show_legend))
         _ = [fig.add_trace(trace, row=1, col=i) for trace in traces]
+    max_axes = pd.DataFrame(max_petals)
 
     # Determine maximum r-axis and r-step.
     # Adding one and using floor(/2.5) was the
@@ -848,19 +989,10 @@ def update_rose_sxs(rose_dict, units):
     return fig
 
 
-@app.callback(Output("rose_sxs", "config"), Input("comparison-rose-data", "data"))
-def update_sxs_rose_config(rose_dict):
-    config = copy.deepcopy(luts.fig_configs)
-    if "data_list" in rose_dict:
-        # if true, then there is sufficient data for comparison roses
-        # and can proceed to update filename for download
-        sid = rose_dict["sid"]
-        config["toImageButtonOptions"]["filename"] = f"{sid}_comparison_wind_rose"
-    else:
-        # if it's not there, disable download button
-        config["modeBarButtonsToRemove"].append("toImage")
-
-    return config
+# calm change wording and fill color for the change in winds chart,
+# indexed by whether calms increased (0 = decreased, 1 = increased)
+calm_change_text = (luts.calm_diff_lut[False]["text"], luts.calm_diff_lut[True]["text"])
+calm_change_fill = (luts.calm_diff_lut[False]["fill"], luts.calm_diff_lut[True]["fill"])
 
 
 @app.callback(
@@ -875,119 +1007,93 @@ def update_diff_rose(rose_dict, units, pcount):
     """Generate difference wind rose by taking difference in
     frequencies of speed/direction bins
     """
-    # set up layout info first, used in event that selected station lacks
-    # sufficient data for comparison
-    station_name = luts.map_data.loc[rose_dict["sid"]]["real_name"]
-
-    rose_layout = {
-        "title": dict(text="", font=dict(size=18),),
-        "height": 700,
-        "font": dict(family="Open Sans", size=14),
-        "margin": {"l": 0, "r": 0, "b": 20, "t": 75},
-        "legend": {"orientation": "h", "x": 0, "y": 1},
-        "polar": {
-            "legend": {"orientation": "h"},
-            "angularaxis": {
-                "rotation": 90,
-                "direction": "clockwise",
-                "tickmode": "array",
-                "tickvals": [0, 45, 90, 135, 180, 225, 270, 315],
-                "ticks": "",  # hide tick marks
-                "ticktext": ["N", "NE", "E", "SE", "S", "SW", "W", "NW"],
-                "tickfont": {"color": "#444"},
-                "showline": False,  # no boundary circles
-                "color": "#888",  # set most colors to #888
-                "gridcolor": "#efefef",
-            },
-            "radialaxis": {
-                "color": "#888",
-                "gridcolor": "#efefef",
-                "ticksuffix": "%",
-                "showticksuffix": "last",
-                "tickcolor": "rgba(0, 0, 0, 0)",
-                "tick0": 0,
-                "dtick": {8:2, 16:2, 36:1}[pcount],
-                "ticklen": 10,
-                "showline": False,  # hide the dark axis line
-                "tickfont": {"color": "#444"},
-            },
-            "hole": 0.2,
-        },
-        "paper_bgcolor": luts.background_color,
-    }
+    station_name = luts.station_names[rose_dict["sid"]]
+    # radial axis tick spacing, also used in event that selected station
+    # lacks sufficient data for comparison
+    dtick = {8: 2, 16: 2, 36: 1}[pcount]
 
     if "trace_dict" in rose_dict:
         # this handles case of insufficient data for station
         # trace_dict only present if insufficient data for comparison
         empty_trace = go.Barpolar(rose_dict["trace_dict"])
-        rose_layout["annotations"] = [rose_dict["anno_dict"]]
+        rose_layout = make_rose_layout(
+            "", dtick, 0.2, annotations=[rose_dict["anno_dict"]]
+        )
 
         return {"layout": rose_layout, "data": [empty_trace]}
 
-    data_list = [pd.DataFrame(df_dict) for df_dict in rose_dict["data_list"]]
-
-    rose_data = data_list[0]
-    # compute freuency differences
-    rose_data["frequency"] = data_list[1]["frequency"] - rose_data["frequency"]
-
-    traces = []
-    get_rose_traces(rose_data, traces, units, True, True)
+    traces = get_diff_rose_traces(rose_dict["diff_dict"], units)
 
     station_calms = pd.DataFrame(rose_dict["calms_dict"])
     # compute calm difference
     calm_diff = station_calms.iloc[1]["percent"] - station_calms.iloc[0]["percent"]
-    calm_change = luts.calm_diff_lut[calm_diff > 0]
-    calm_text = (
-        f"calms <b>{calm_change['text']}</b><br>by {abs(round(calm_diff * 100, 1))}%"
-    )
-    rose_layout["annotations"] = [
-        {
-            "x": 0.5,
-            "y": 0.5,
-            "showarrow": False,
-            "text": calm_text,
-            "xref": "paper",
-            "yref": "paper",
-        }
-    ]
-    rose_layout["shapes"] = [
-        {
-            "type": "circle",
-            "x0": 0.455,
-            "y0": 0.4,
-            "x1": 0.545,
-            "y1": 0.6,
-            "text": calm_text,
-            "xref": "paper",
-            "yref": "paper",
-            "line": {"color": "#fff"},
-            "opacity": calm_diff / 0.2,
-            "fillcolor": calm_change["fill"],
-        }
-    ]
-
+    calm_increased = int(calm_diff > 0)
+    calm_text = f"calms <b>{calm_change_text[calm_increased]}</b><br>by {abs(round(calm_diff * 100, 1))}%"
     decade1, decade2 = rose_dict["target_decades"]
-    rose_layout["title"][
-        "text"
-    ] = f"Change in winds from {decade1} to {decade2}, {station_name}"
+    rose_layout = make_rose_layout(
+        f"Change in winds from {decade1} to {decade2}, {station_name}",
+        dtick,
+        0.2,
+        annotations=[
+            {
+                "x": 0.5,
+                "y": 0.5,
+                "showarrow": False,
+                "text": calm_text,
+                "xref": "paper",
+                "yref": "paper",
+            }
+        ],
+        shapes=[
+            {
+                "type": "circle",
+                "x0": 0.455,
+                "y0": 0.4,
+                "x1": 0.545,
+                "y1": 0.6,
+                "text": calm_text,
+                "xref": "paper",
+                "yref": "paper",
+                "line": {"color": "#fff"},
+                "opacity": calm_diff / 0.2,
+                "fillcolor": calm_change_fill[calm_increased],
+            }
+        ],
+    )
 
     return {"layout": rose_layout, "data": traces}
 
 
-@app.callback(Output("rose_diff", "config"), Input("comparison-rose-data", "data"))
-def update_diff_rose_config(rose_dict):
-    config = copy.deepcopy(luts.fig_configs)
+# config for comparison charts lacking data, with the download button removed
+no_download_fig_config = {
+    **luts.fig_configs,
+    "modeBarButtonsToRemove": luts.fig_configs["modeBarButtonsToRemove"]
+    + ["toImage"],
+}
+
+
+def get_comparison_config(rose_dict, suffix):
+    """
+    Figure config shared by the side-by-side and change in winds charts,
+    differing only by the download filename suffix.
+    """
     if "data_list" in rose_dict:
         # if true, then there is sufficient data for comparison roses
         # and can proceed to update filename for download
-        sid = rose_dict["sid"]
-        config["toImageButtonOptions"]["filename"] = f"{sid}_change_in_winds"
-    else:
-        # if it's not there, disable download button
-        config["modeBarButtonsToRemove"].append("toImage")
+        return get_fig_config(f"{rose_dict['sid']}{suffix}")
 
-    return config
+    # if it's not there, disable download button
+    return no_download_fig_config
+
+
+for chart_id, filename_suffix in [
+    ("rose_sxs", "_comparison_wind_rose"),
+    ("rose_diff", "_change_in_winds"),
+]:
+    app.callback(Output(chart_id, "config"), Input("comparison-rose-data", "data"))(
+        partial(get_comparison_config, suffix=filename_suffix)
+    )
 
 
 if __name__ == "__main__":
-    application.run(debug=os.environ["FLASK_DEBUG"], port=8080)
+    application.run(debug=luts.env_config["flask_debug"], port=8080)
@@ -3,9 +3,6 @@
 GUI code
 """
 
-import os
-from datetime import datetime
-import plotly.graph_objs as go
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_dangerously_set_inner_html as ddsih
@@ -13,27 +10,31 @@ import luts
 
 
 # For hosting
-path_prefix = os.getenv("REQUESTS_PATHNAME_PREFIX") or "/"
+path_prefix = luts.env_config["path_prefix"]
 
-map_figure = go.Figure(data=luts.map_airports_trace, layout=luts.map_layout)
+# The map starts with only the base layout; the airport markers are
+# drawn by the update_selected_airport_on_map callback, which runs on
+# page load, so they don't need to be embedded in the initial layout.
+map_figure = {"data": [], "layout": luts.map_layout}
+
+# Placeholder for the charts, which are filled in by callbacks.
+# A plain figure spec avoids building (and validating) a go.Figure
+# for each one when the layout is created.
+empty_figure = {"data": [], "layout": {}}
 
 # Helper function
-def wrap_in_section(content, section_classes="", container_classes="", div_classes=""):
+def wrap_in_section(content, section_classes="", container_classes=""):
     """
     Helper function to wrap sections.
     Accepts an array of children which will be assigned within
     this structure:
     <section class="section">
-        <div class="container">
-            <div>[children]...
+        <div class="container">[children]...
     """
     return html.Section(
         className="section " + section_classes,
         children=[
-            html.Div(
-                className="container " + container_classes,
-                children=[html.Div(className=div_classes, children=content)],
-            )
+            html.Div(className="container " + container_classes, children=content)
         ],
     )
 
@@ -52,8 +53,10 @@ def wrap_in_field(label, control, className=""):
     )
 
 
-header = ddsih.DangerouslySetInnerHTML(
-    f"""
+# Static HTML for the page header and footer. These are placed
+# around the app in application.py's index_string, so they are
+# served with the page rather than as part of the Dash layout.
+header_html = f"""
 <header>
 <div class="container">
 <nav class="navbar" role="navigation" aria-label="main navigation">
@@ -86,39 +89,22 @@ header = ddsih.DangerouslySetInnerHTML(
 </div>
 </header>
 """
-)
 
-about = wrap_in_section(
-    [
-        ddsih.DangerouslySetInnerHTML(
-            """
+# Static HTML for the intro and help text, each rendered as
+# a single block to keep the number of components down.
+about_html = f"""
+<section class="section words-block-grey">
+<div class="container content">
             <h1 class="title is-3">Historical Winds at Alaska Airports</h1>
             <p class="content is-size-4">Explore visualizations of historical wind data recorded at Alaska airports. To see an airport’s wind data, click a dot on the map or choose from the list. All graphics will update with data from your chosen airport.</p>
             <p class="content is-size-5 camera-icon">Click the <span>
-<svg viewBox="0 0 1000 1000" class="icon" height="1em" width="1em"><path d="m500 450c-83 0-150-67-150-150 0-83 67-150 150-150 83 0 150 67 150 150 0 83-67 150-150 150z m400 150h-120c-16 0-34 13-39 29l-31 93c-6 15-23 28-40 28h-340c-16 0-34-13-39-28l-31-94c-6-15-23-28-40-28h-120c-55 0-100-45-100-100v-450c0-55 45-100 100-100h800c55 0 100 45 100 100v450c0 55-45 100-100 100z m-400-550c-138 0-250 112-250 250 0 138 112 250 250 250 138 0 250-112 250-250 0-138-112-250-250-250z m365 380c-19 0-35 16-35 35 0 19 16 35 35 35 19 0 35-16 35-35 0-19-16-35-35-35z" transform="matrix(1 0 0 -1 0 850)"></path></svg>
+<svg class="icon" height="1em" width="1em"><use href="{path_prefix}assets/icons.svg#camera"></use></svg>
 </span> icon in the upper-right of each chart to download it.</p>
-            """
-        )
-    ],
-    section_classes="words-block-grey",
-    div_classes="content",
-)
-
-
-def remove_asos_awos(location):
-    """remove the ASOS and AWOS strings from station_name field,
-    for airports dropdown"""
-    location = location.replace("(ASOS)", "")
-    location = location.replace("(AWOS)", "")
-    return location
-
+</div>
+</section>
+"""
 
-def format_location_name(station_name, sid):
-    """Uses new location names"""
-    if sid in luts.new_location_names:
-        return luts.new_location_names[sid]
-    else:
-        return station_name
+about = ddsih.DangerouslySetInnerHTML(about_html)
 
 
 airports_dropdown_field = wrap_in_field(
@@ -126,11 +112,8 @@ airports_dropdown_field = wrap_in_field(
     dcc.Dropdown(
         id="airports-dropdown",
         options=[
-            {
-                "label": f"{format_location_name(remove_asos_awos(airport.station_name).title(), index)} / {airport.real_name} ({index})",
-                "value": index,
-            }
-            for index, airport in luts.map_data.iterrows()
+            {"label": label, "value": index}
+            for index, label in luts.map_data["dropdown_label"].items()
         ],
         value="PAFA",
     ),
@@ -209,7 +192,7 @@ wind_rose_section = wrap_in_section(
         children=[
             html.Div(
                 className="column is-four-fifths",
-                children=[dcc.Graph(id="rose", figure=go.Figure(),),],
+                children=[dcc.Graph(id="rose", figure=empty_figure,),],
             ),
             html.Div(
                 className="column is-one-fifth",
@@ -230,7 +213,7 @@ monthly_wind_rose_intro = wrap_in_section(
 )
 
 monthly_wind_rose_section = wrap_in_section(
-    dcc.Graph(id="rose_monthly", figure=go.Figure(),)
+    dcc.Graph(id="rose_monthly", figure=empty_figure,)
 )
 
 crosswind_intro = wrap_in_section(
@@ -245,7 +228,7 @@ crosswind_intro = wrap_in_section(
 )
 
 crosswind_section = wrap_in_section(
-    dcc.Graph(id="exceedance_plot", figure=go.Figure(),)
+    dcc.Graph(id="exceedance_plot", figure=empty_figure,)
 )
 
 wind_energy_intro = wrap_in_section(
@@ -267,7 +250,7 @@ wind_energy_intro = wrap_in_section(
     container_classes="content is-size-5",
 )
 
-wind_energy_section = wrap_in_section(dcc.Graph(id="wep_box", figure=go.Figure(),))
+wind_energy_section = wrap_in_section(dcc.Graph(id="wep_box", figure=empty_figure,))
 
 historical_roses_intro = wrap_in_section(
     ddsih.DangerouslySetInnerHTML(
@@ -281,7 +264,7 @@ historical_roses_intro = wrap_in_section(
 )
 
 historical_roses_section = wrap_in_section(
-    dcc.Graph(id="rose_sxs", figure=go.Figure(),)
+    dcc.Graph(id="rose_sxs", figure=empty_figure,)
 )
 
 historical_change_intro = wrap_in_section(
@@ -296,12 +279,12 @@ historical_change_intro = wrap_in_section(
 )
 
 historical_change_section = wrap_in_section(
-    dcc.Graph(id="rose_diff", figure=go.Figure(),),
+    dcc.Graph(id="rose_diff", figure=empty_figure,),
 )
 
-help_text = wrap_in_section(
-    ddsih.DangerouslySetInnerHTML(
-        """
+help_html = """
+<section class="section words-block-grey">
+<div class="container content is-size-5">
 <h3 class="title is-4">About Airport Wind Data</h3>
 
 <p>Wind speed/direction observations source: <a href="https://mesonet.agron.iastate.edu/request/download.phtml?network=AK_ASOS">Iowa Environmental Mesonet</a>, run by Iowa State University. Houses data collected by the <a href="https://www.ncdc.noaa.gov/data-access/land-based-station-data/land-based-datasets/automated-surface-observing-system-asos">Automated Surface Observing System</a> network and the <a href="https://www.ncdc.noaa.gov/data-access/land-based-station-data/land-based-datasets/automated-weather-observing-system-awos">Automated Weather Observing System</a>.</p>
@@ -320,40 +303,32 @@ help_text = wrap_in_section(
 <ul>
     <li>The <a href="http://windtool.accap.uaf.edu/">ACCAP Community Winds tool</a> takes a climatological approach with much of the same data, and includes model-based projections of future winds.</li
 </ul>
+</div>
+</section>
 """
-    ),
-    section_classes="words-block-grey",
-    container_classes="content is-size-5",
-)
 
+help_text = ddsih.DangerouslySetInnerHTML(help_html)
 
-# Used in copyright date
-current_year = datetime.now().year
 
-footer = html.Footer(
-    className="footer",
-    children=[
-        ddsih.DangerouslySetInnerHTML(
-            f"""
+footer_html = f"""
+<footer class="footer">
 <footer class="container">
     <div class="wrapper is-size-6">
         <img src="{path_prefix}assets/UAF.svg"/>
         <div class="wrapped">
             <p>This tool was developed by the <a href="https://uaf-snap.org">Scenarios Network for Alaska & Arctic Planning (SNAP)</a> in collaboration with the <a href="https://wrcc.dri.edu">Western Regional Climate Center</a>. SNAP is a research group at the <a href="https://uaf-iarc.org/">International Arctic Research Center</a> at the <a href="https://uaf.edu/uaf/">University of Alaska Fairbanks</a>.</p>
-            <p>Copyright &copy; {current_year} University of Alaska Fairbanks.  All rights reserved.</p>
+            <p>Copyright &copy; {luts.current_year} University of Alaska Fairbanks.  All rights reserved.</p>
             <p>UA is an AA/EO employer and educational institution and prohibits illegal discrimination against any individual.  <a href="https://www.alaska.edu/nondiscrimination/">Statement of Nondiscrimination</a> and <a href="https://www.alaska.edu/records/records/compliance/gdpr/ua-privacy-statement/">Privacy Statement</a>.</p>
         </div>
     </div>
 </footer>
-            """
-        ),
-    ],
-)
+</footer>
+"""
+
 
 layout = html.Div(
     style={"backgroundColor": luts.background_color},
     children=[
-        header,
         about,
         map_selector_section,
         wind_rose_intro,
@@ -369,7 +344,6 @@ layout = html.Div(
         historical_change_intro,
         historical_change_section,
         help_text,
-        footer,
         dcc.Store(id="comparison-rose-data"),
     ],
 )
@@ -3,21 +3,70 @@
 Contains common lookup tables between GUI/application code
 """
 
+import os
+from datetime import datetime
 import pandas as pd
-import numpy as np
 import plotly.graph_objs as go
 import plotly.io as pio
 
+# Environment settings, read once here so other modules
+# don't need to consult os.environ themselves.
+# REQUESTS_PATHNAME_PREFIX is the URL fragment used for hosting,
+# GTAG_ID is the Google Analytics ID (set it empty to disable).
+env_config = {
+    "path_prefix": os.getenv("REQUESTS_PATHNAME_PREFIX") or "/",
+    "gtag_id": os.getenv("GTAG_ID", "G-1J75Z1N5FP"),
+    "flask_debug": os.getenv("FLASK_DEBUG", "").lower() in ("1", "true"),
+}
+
+# Used in copyright date
+current_year = datetime.now().year
+
+
+def is_current(cache_fp, source_fps):
+    """Check whether a cached file exists and is at least as new
+    as all of the files it was built from
+
+    Args:
+        cache_fp (str): path to the cached file
+        source_fps (list): paths to the files the cache was built from
+
+    Returns:
+        True if the cached file can be used
+    """
+    if not os.path.exists(cache_fp):
+        return False
+    cache_mtime = os.path.getmtime(cache_fp)
+    return all(os.path.getmtime(fp) <= cache_mtime for fp in source_fps)
+
+
+def read_airport_meta():
+    """Read the scraped airport metadata and update it with the
+    manually-scraped info on airport and runway names
+
+    Returns:
+        pandas.DataFrame of airport metadata
+    """
+    airport_meta = pd.read_csv("data/airport_meta.csv").set_index("sid")
+    return (
+        pd.read_csv("data/meta_amend.csv")
+        .set_index("sid")
+        .combine_first(airport_meta)
+        .reset_index()
+    )
+
+
 # need to get map data ready here first for use in gui
 # need to filter to airports meeting minimum data requirements
-airport_meta = pd.read_csv("data/airport_meta.csv").set_index("sid")
-# load manually-scraped info to update these metadata with airport and runway names
-airport_meta = (
-    pd.read_csv("data/meta_amend.csv")
-    .set_index("sid")
-    .combine_first(airport_meta)
-    .reset_index()
-)
+# the combined metadata is saved by pipeline/build_luts_cache.py,
+# read from the CSVs if that hasn't been run since they changed
+airport_meta_fp = "data/airport_meta.pickle"
+meta_source_fps = ["data/airport_meta.csv", "data/meta_amend.csv"]
+if is_current(airport_meta_fp, meta_source_fps):
+    airport_meta = pd.read_pickle(airport_meta_fp)
+else:
+    airport_meta = read_airport_meta()
+
 # hardcoded communtiy names to replace values in station_name
 new_location_names = {
     "PADK": "Adak",
@@ -91,15 +140,60 @@ new_location_names = {
     "PANN": "Nenana",
 }
 
-# remove duplicate rows after discarding runway info to have unique locations
-map_data = (
-    airport_meta.drop(columns=["rw_name", "rw_heading"])
-    .drop_duplicates()
-    .set_index("sid")
-)
-# use only the unique sid values in roses df
+
+def build_map_data(airport_meta, keep_sids):
+    """Make the table of unique airport locations used for the map
+    and the airports dropdown
+
+    Args:
+        airport_meta (pandas.DataFrame): airport metadata from read_airport_meta
+        keep_sids (array-like): station ids of airports with wind roses
+
+    Returns:
+        pandas.DataFrame of airport locations indexed by sid
+    """
+    # remove duplicate rows after discarding runway info to have unique locations,
+    # and use only the unique sid values in roses df. Both are applied as one
+    # mask, selecting the rows and columns to keep in a single step.
+    keep_cols = airport_meta.columns.drop(["rw_name", "rw_heading"])
+    keep_rows = airport_meta["sid"].isin(keep_sids) & ~airport_meta.duplicated(
+        subset=keep_cols
+    )
+    map_data = airport_meta.loc[keep_rows, keep_cols].set_index("sid")
+
+    # labels for the airports dropdown, built once here instead of per-row in gui:
+    # strip the ASOS/AWOS strings from station_name and use the hardcoded
+    # community names where available
+    location_names = (
+        map_data["station_name"]
+        .str.replace("(ASOS)", "", regex=False)
+        .str.replace("(AWOS)", "", regex=False)
+        .str.title()
+    )
+    location_names = (
+        map_data.index.to_series().map(new_location_names).fillna(location_names)
+    )
+    return map_data.assign(
+        dropdown_label=location_names
+        + " / "
+        + map_data["real_name"]
+        + " ("
+        + map_data.index
+        + ")"
+    )
+
+
 roses = pd.read_pickle("data/roses.pickle")
-map_data = map_data.loc[map_data.index.isin(roses["sid"].unique())]
+# the finished map table is also saved by pipeline/build_luts_cache.py,
+# it also depends on new_location_names in this file
+map_data_fp = "data/map_data.pickle"
+if is_current(map_data_fp, meta_source_fps + ["data/roses.pickle", __file__]):
+    map_data = pd.read_pickle(map_data_fp)
+else:
+    map_data = build_map_data(airport_meta, roses["sid"].unique())
+
+# airport names by sid, for quick lookup in callbacks
+station_names = map_data["real_name"].to_dict()
 
 # Plotly format template
 plotly_template = pio.templates["simple_white"]
@@ -118,15 +212,18 @@ plotly_template.layout.yaxis = axis_configs
 
 
 # This trace is shared so we can highlight specific communities.
+# The trace and map layout are validated once here and kept as plain
+# dicts, so figures returned by the map callback don't go through the
+# graph object validation and conversion again when encoded.
 map_airports_trace = go.Scattermapbox(
-    lat=map_data.loc[:, "lat"],
-    lon=map_data.loc[:, "lon"],
+    lat=map_data["lat"].to_numpy(),
+    lon=map_data["lon"].to_numpy(),
     mode="markers",
     marker={"size": 10, "color": "rgb(80,80,80)"},
     line={"color": "rgb(0, 0, 0)", "width": 2},
-    text=map_data.real_name,
+    text=map_data["real_name"].to_numpy(),
     hoverinfo="text",
-)
+).to_plotly_json()
 
 map_layout = go.Layout(
     autosize=True,
@@ -134,30 +231,7 @@ map_layout = go.Layout(
     mapbox=dict(style="carto-positron", zoom=3.25, center=dict(lat=63, lon=-158)),
     showlegend=False,
     margin=dict(l=0, r=0, t=0, b=0),
-)
-
-# Needs to be a numpy array for ease of building relevant
-# strings for some code
-# 50, 75, 85, 95, 99
-percentiles = np.array(
-    [
-        "mph (50th %ile) <b>Common<b>",
-        "mph (75th %ile)",
-        "mph (85th %ile) <b>Occasional</b>",
-        "mph (95th %ile)",
-        "mph (99th %ile) <b>Rare</b>",
-    ]
-)
-
-durations = {
-    1: "1 continuous hour or more",
-    6: "6+ hours",
-    12: "12+ hours",
-    24: "24+ hours",
-    48: "48+ hours",
-}
-
-gcms = {"CCSM4": "NCAR-CCSM4", "CM3": "GFDL-CM3"}
+).to_plotly_json()
 
 months = {
     1: "January",
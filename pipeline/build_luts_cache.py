@@ -0,0 +1,37 @@
+# pylint: disable=C0103,C0301,E0401
+"""Save the lookup tables that luts.py builds from the CSV
+metadata files, so the app can load them directly.
+
+Writes "airport_meta.pickle", the scraped airport metadata
+combined with the manual amendments in "meta_amend.csv", and
+"map_data.pickle", the unique airport locations with wind roses.
+
+Should be re-run whenever airport_meta.csv, meta_amend.csv or
+roses.pickle change.
+"""
+
+import os
+import sys
+
+# this hack is done to allow import from luts.py in app dir
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from luts import read_airport_meta, build_map_data, roses
+
+
+def main():
+    """Save the cached lookup tables"""
+    airport_meta = read_airport_meta()
+    out_fp = "data/airport_meta.pickle"
+    airport_meta.to_pickle(out_fp)
+
+    print(f"Combined airport metadata saved to {out_fp}")
+
+    map_data = build_map_data(airport_meta, roses["sid"].unique())
+    out_fp = "data/map_data.pickle"
+    map_data.to_pickle(out_fp)
+
+    print(f"Map data saved to {out_fp}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ all AK_ASOS network stations, for 1980-2020
 
 import os
 import time
-from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import requests
 
@@ -57,41 +57,63 @@ def make_uris(sids, start, end):
     return [service + f"station={sid}" for sid in sids]
 
 
-def get_with_retry(uri, max_retry=5):
+def make_session(pool_size):
+    """Make a requests session that keeps connections to IEM alive
+
+    Args:
+        pool_size (int): number of connections to keep in the pool,
+            should match the number of concurrent downloads
+
+    Returns:
+        a requests.Session
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def get_with_retry(uri, session=None, max_retry=5):
     """Wrapper for requests.get() to retry
 
     Args:
         uri (str): URI to request
+        session (requests.Session): session to make requests with,
+            requests.get is used if not provided
         max_retry (int): number of retries to make
 
     Returns:
         the requests response
     """
-    r = requests.get(uri)
+    get = session.get if session is not None else requests.get
+    r = get(uri)
     k = 0
     while r.status_code != 200:
         if k == max_retry:
             print(f"{uri} failed.")
             break
         time.sleep(1)
-        r = requests.get(uri)
+        r = get(uri)
         k += 1
 
     return r
 
 
-def download_file(uri, out_fp):
+def download_file(uri, out_fp, session=None):
     """Download a single file to a directory
 
     Args:
         uri (str): uri of query to download
         out_fp (PosixPath): PosixPath object of output filepath
+        session (requests.Session): session to make requests with
 
     Returns:
         path to the downloaded file
     """
     # download and write
-    r = get_with_retry(uri)
+    r = get_with_retry(uri, session)
     if r.status_code == 200:
         f = open(out_fp, "w")
         f.write(r.text)
@@ -104,15 +126,18 @@ def download_file(uri, out_fp):
     return out_fp
 
 
-def run_download(network, start, end, out_dir, ncpus=8):
+def run_download(network, start, end, out_dir, nworkers=8):
     """Download urls to an output directory in parallel
 
+    Downloads are I/O bound, so threads sharing a single session
+    (and its pool of open connections) are used instead of processes.
+
     Args:
         network (str): name of ASOS network on IEM (e.g. AK_ASOS)
         start (str): start date string (YYYY-mm-dd)
         end (str): end date string (YYYY-mm-dd)
         out_dir (PosixPath): PosixPath object of directory to write files
-        ncpus (int): number of cores to use in downloading files in parallel
+        nworkers (int): number of files to download concurrently
 
     Returns:
         paths of successfully downloaded files
@@ -127,8 +152,11 @@ def run_download(network, start, end, out_dir, ncpus=8):
 
     print(f"Downloading {len(uris)} files", sep="...")
 
-    with Pool(ncpus) as pool:
-        out_fps = pool.starmap(download_file, zip(uris, out_fps))
+    session = make_session(nworkers)
+    with session, ThreadPoolExecutor(nworkers) as executor:
+        out_fps = list(
+            executor.map(download_file, uris, out_fps, [session] * len(uris))
+        )
 
     print("done.")
 
@@ -4,24 +4,67 @@
 import argparse
 import os
 import time
+from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+# station data for the pool workers, set by init_worker
+station_data = None
 
-def prep_write_station(station, out_dir):
-    """Write a station's wind data to CSV in ckan_dir"""
-    # set records with wind direction == 0 to 360
-    station.loc[(station["wd"] == 0) & (station["ws"] != 0), "wd"] = 360
+
+def prep_write_station(station, out_dir, out_format="csv", skip_before=None):
+    """Write a station's wind data to CSV (or Parquet) in ckan_dir.
+    If skip_before is given, stations whose file already exists and
+    was modified after that time are not written again."""
     sid = station["sid"].iloc[0]
-    out_fp = f"alaska_airports_hourly_winds_{sid}.csv"
-    station.drop(columns="sid").to_csv(
-        out_dir.joinpath(out_fp), float_format="%.2f", index=False
+    out_fp = f"alaska_airports_hourly_winds_{sid}.{out_format}"
+    out_path = out_dir.joinpath(out_fp)
+    if (
+        skip_before is not None
+        and out_path.exists()
+        and out_path.stat().st_mtime >= skip_before
+    ):
+        return out_fp
+
+    # set records with wind direction == 0 to 360
+    wd = station["wd"].to_numpy()
+    station = station.assign(
+        wd=np.where((wd == 0) & (station["ws"].to_numpy() != 0), 360, wd)
     )
+    if out_format == "parquet":
+        # requires pyarrow
+        station[["ts", "ws", "wd"]].to_parquet(
+            out_path, compression="snappy", index=False
+        )
+    else:
+        # write only the data columns rather than copying the frame without sid
+        station.to_csv(
+            out_path,
+            columns=["ts", "ws", "wd"],
+            float_format="%.2f",
+            index=False,
+        )
 
     return out_fp
 
 
+def init_worker(stations):
+    """Make the station data available to the pool workers"""
+    global station_data
+    station_data = stations
+
+
+def write_station_rows(bounds, out_dir, out_format="csv", skip_before=None):
+    """Write the station occupying rows [start, stop) of the station data
+    shared with the pool workers"""
+    start, stop = bounds
+    return prep_write_station(
+        station_data.iloc[start:stop], out_dir, out_format, skip_before
+    )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Prep the cleaned station data for hosting"
@@ -35,31 +78,63 @@ if __name__ == "__main__":
         help="Number of cores to use with multiprocessing",
         default=8,
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        action="store",
+        dest="out_format",
+        choices=["csv", "parquet"],
+        help="File format for the station data (parquet requires pyarrow)",
+        default="csv",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        dest="force",
+        help="Rewrite station files that are newer than stations.pickle",
+    )
     args = parser.parse_args()
     ncpus = args.ncpus
+    out_format = args.out_format
 
     base_dir = Path(os.getenv("BASE_DIR"))
     ckan_dir = base_dir.joinpath("ckan_data_package")
     ckan_dir.mkdir(exist_ok=True)
 
     print("Reading cleaned station data", end="...")
-    stations = pd.read_pickle(base_dir.joinpath("stations.pickle"))
+    stations_fp = base_dir.joinpath("stations.pickle")
+    stations = pd.read_pickle(stations_fp)
+    # files written since the station data last changed are kept unless forced
+    skip_before = None if args.force else stations_fp.stat().st_mtime
     print("done")
     print(
-        f"Writing prepped hourly wind data to individual CSV files using {ncpus}",
+        f"Writing prepped hourly wind data to individual {out_format} files using {ncpus}",
         end="...",
     )
     tic = time.perf_counter()
 
     stations = stations[["sid", "ts", "ws_adj", "wd"]].rename(columns={"ws_adj": "ws"})
+    # categorical sid so filtering, sorting and splitting work on integer codes
+    stations = stations.assign(sid=stations["sid"].astype("category"))
     # filter to stations that are used in the app by removing those not in roses.pickle
     roses = pd.read_pickle("data/roses.pickle")
-    keep_sids = roses["sid"].unique()
-    stations = [
-        (df, ckan_dir) for sid, df in stations.groupby("sid") if sid in keep_sids
-    ]
+    stations = stations[stations["sid"].isin(roses["sid"].unique())]
+    # sort so each station is a contiguous block of rows, and pass
+    # the workers only the bounds of each block. The data itself is
+    # handed over once per worker (inherited when processes are forked)
+    # instead of pickling every station's rows for each task.
+    stations = stations.sort_values("sid", kind="mergesort")
+    sids = stations["sid"].cat.codes.to_numpy()
+    starts = np.flatnonzero(np.r_[True, sids[1:] != sids[:-1]])
+    bounds = zip(starts, np.r_[starts[1:], len(sids)])
 
-    with Pool(ncpus) as pool:
-        _ = pool.starmap(prep_write_station, stations)
+    write_station = partial(
+        write_station_rows,
+        out_dir=ckan_dir,
+        out_format=out_format,
+        skip_before=skip_before,
+    )
+    with Pool(ncpus, initializer=init_worker, initargs=(stations,)) as pool:
+        _ = list(pool.imap_unordered(write_station, bounds, chunksize=4))
 
     print(f"Done, {round(time.perf_counter() - tic, 2)}s")
@@ -2,61 +2,121 @@
 """Pre-process station data for app ingest"""
 
 import argparse
-import math
 import os
 import sys
 import time
 from datetime import datetime
+from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
-from random import choice
 import numpy as np
 import pandas as pd
 from scipy.stats import ks_2samp
 # this hack is done to alllow import from luts.py in app dir
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from luts import speed_ranges, exceedance_classes
+from luts import speed_ranges, exceedance_classes, decades
+
+# stations must have observations from before these dates to be
+# included in the summary roses, the comparison roses, and the
+# crosswind exceedance data, respectively
+summary_min_ts = pd.Timestamp("2010-06-01")
+compare_min_ts = pd.Timestamp("1991-01-01")
+crosswind_min_ts = pd.Timestamp("2015-01-01")
+
+# number of days in each decade, for checking sufficient comparison data
+decade_ndays = {
+    decade: (pd.Timestamp(f"{dyear + 9}-12-31") - pd.Timestamp(f"{dyear}-01-01")).days
+    for dyear, decade in decades.items()
+}
+
+# the only station columns chunk_to_rose uses, the station data is narrowed
+# to these before it's split up and sent to the pool workers
+rose_columns = ["sid", "ws", "wd", "decade", "month"]
+
+# wind speed range bucket names and bounds, and wind rose direction class
+# names for each petal count (36, 16 and 8), shared by all calls to
+# chunk_to_rose. Direction class 0 is for the sector centered on north.
+speed_names = np.array(list(speed_ranges))
+speed_lower, speed_upper = np.array([info["range"] for info in speed_ranges.values()]).T
+direction_classes = {
+    36: np.array(list(range(1, 36)) + [0], dtype=np.float32),
+    16: np.array(list(np.arange(2.25, 34, 2.25)) + [0], dtype=np.float32),
+    8: np.array(list(np.arange(4.5, 32, 4.5)) + [0], dtype=np.float32),
+}
+
+
+def get_chunksize(ntasks, ncpus):
+    """Number of tasks to send to a pool worker at a time, using the
+    same rule as Pool.map so that lazily-fed iterators are batched alike
+
+    Args:
+        ntasks (int): number of tasks
+        ncpus (int): number of pool workers
+
+    Returns:
+        chunksize for Pool.imap
+    """
+    return max(1, -(-ntasks // (ncpus * 4)))
+
+
+def pool_imap(pool, func, iterable, chunksize=1):
+    """Map a function over an iterable using a pool of workers, or
+    in this process if there is no pool (running on a single cpu)
+
+    Args:
+        pool (multiprocessing.Pool): pool of workers, or None
+        func (function): function to apply
+        iterable: items to apply func to
+        chunksize (int): number of items to send to a worker at a time
+
+    Returns:
+        iterator of results, in the same order as iterable
+    """
+    if pool is None:
+        return map(func, iterable)
+    return pool.imap(func, iterable, chunksize)
 
 
-def check_sufficient_comparison_rose_data(station, r1=0.25, r2=0.75):
-    """ check sufficient data for a single station, and return
-    the station data for the 2010s and the oldest decade available 
-    between 80s and 90s
+def find_comparison_decades(stations, r1=0.25, r2=0.75):
+    """Check sufficient data for all stations and decades in one pass, and
+    find the decades to compare for each station: the 2010s and the oldest
+    decade available between 80s and 90s
 
     Args:
-        station (pandas.DataFrame): Station DataFrame
+        stations (pandas.DataFrame): station data for all stations
         r1 (float): daily observation threshold (proportion)
         r2 (float): total sufficient day threshold (proportion)
-    
-    Returns:
-        DataFrame of station data filtered to first and last decade 
-        with sufficient data if available. Otherwise, None.
 
+    Returns:
+        pandas.MultiIndex of the (sid, decade) pairs to compare, only for
+        stations with sufficient data in the 2010s and an older decade
     """
+    # number of observations on each day, then the number of days meeting
+    # the daily threshold, for each station and decade. Days are truncated
+    # datetime64 values rather than python dates from .dt.date, so they
+    # are grouped as integers.
+    days = stations["ts"].to_numpy().astype("datetime64[D]")
+    obs_per_day = stations.groupby(["sid", "decade", days], observed=True).size()
+    good_days = (
+        (obs_per_day / 24 > r1).groupby(level=["sid", "decade"], observed=True).sum()
+    )
+    ndays = good_days.index.get_level_values("decade").map(decade_ndays)
+    is_sufficient = good_days.to_numpy() / ndays.to_numpy() > r2
+    sufficient = good_days.index[is_sufficient].to_frame(index=False)
+
+    recent = sufficient[sufficient["decade"] == "2010-2019"]
+    # oldest sufficient decade for the stations with sufficient 2010s data
+    old = (
+        sufficient[
+            sufficient["decade"].isin(["1980-1989", "1990-1999"])
+            & sufficient["sid"].isin(recent["sid"])
+        ]
+        .sort_values("decade")
+        .drop_duplicates("sid")
+    )
+    recent = recent[recent["sid"].isin(old["sid"])]
 
-    def is_sufficient(df, r1, r2):
-        """Helper function to check if there sufficient sampling in a time series"""
-        dyear = int(str(df["ts"].dt.year.values[0])[:3] + "0")
-        ndays = (
-            pd.to_datetime(f"{dyear + 9}-12-31") - pd.to_datetime(f"{dyear}-01-01")
-        ).days
-        return (df.ts.dt.date.value_counts() / 24 > r1).sum() / ndays > r2
-
-    station = {decade: df for decade, df in station.groupby("decade")}
-    decades = list(station.keys())
-    if "2010-2019" not in decades:
-        return None
-    else:
-        recent_data = station["2010-2019"]
-        if is_sufficient(recent_data, r1, r2):
-            old_decades = ["1980-1989", "1990-1999"]
-            decades = [decade for decade in old_decades if decade in decades]
-            for decade in decades:
-                if is_sufficient(station[decade], r1, r2):
-                    return pd.concat([station[decade], station["2010-2019"]])
-            return None  # not sufficient data in old decade(s)
-        else:
-            return None  # insufficient 2010s data
+    return pd.MultiIndex.from_frame(pd.concat([old, recent]))
 
 
 def chunk_to_rose(station):
@@ -64,84 +124,59 @@ def chunk_to_rose(station):
     Builds data suitable for Plotly's wind roses from
     a subset of data.
 
-    Given a subset of data, group by direction and speed.
-    Return accumulator of whatever the results of the
-    incoming chunk are.
+    Given a subset of data, count the observations in each
+    direction class and speed range, for each petal count.
     """
-    # bin into three different petal count categories: 8pt, 16pt, and 26pt
-    bin_list = [
-        list(range(5, 356, 10)),
-        list(np.arange(11.25, 349, 22.5)),
-        list(np.arange(22.5, 338, 45)),
-    ]
-    bname_list = [
-        list(range(1, 36)),
-        list(np.arange(2.25, 34, 2.25)),
-        list(np.arange(4.5, 32, 4.5)),
-    ]
-
-    # Accumulator dataframe.
-    proc_cols = [
-        "sid",
-        "direction_class",
-        "speed_range",
-        "count",
-        "frequency",
-        "decade",
-        "pcount",
-    ]
-    accumulator = pd.DataFrame(columns=proc_cols)
-
-    for bins, bin_names, pcount in zip(bin_list, bname_list, [36, 16, 8]):
-        # Assign directions to bins.
-        # We'll use the exceptional 'NaN' class to represent
-        # 355º - 5º, which would otherwise be annoying.
-        # Assign 0 to that direction class.
-        ds = pd.cut(station["wd"], bins, labels=bin_names)
-        station = station.assign(direction_class=ds.cat.add_categories("0").fillna("0"))
-
-        # First compute yearly data.
-        # For each direction class...
-        directions = station.groupby(["direction_class"])
-        for direction, d_group in directions:
-
-            # For each wind speed range bucket...
-            for bucket, bucket_info in speed_ranges.items():
-                d = d_group.loc[
-                    (
-                        station["ws"].between(
-                            bucket_info["range"][0],
-                            bucket_info["range"][1],
-                            inclusive=True,
-                        )
-                        == True
-                    )
-                ]
-                count = len(d.index)
-                full_count = len(station.index)
-                frequency = 0
-                if full_count > 0:
-                    frequency = round(((count / full_count) * 100), 2)
-
-                accumulator = accumulator.append(
-                    {
-                        "sid": station["sid"].values[0],
-                        "direction_class": direction,
-                        "speed_range": bucket,
-                        "count": count,
-                        "frequency": frequency,
-                        "decade": station["decade"].iloc[0],
-                        "month": station["month"].iloc[0],
-                        "pcount": pcount,
-                    },
-                    ignore_index=True,
-                )
-
-    accumulator = accumulator.astype(
-        {"direction_class": np.float32, "count": np.int32, "frequency": np.float32,}
-    )
+    # Index of the wind speed range bucket for each observation.
+    # Both ends of a range are inclusive, so a speed that falls
+    # exactly on a shared endpoint counts towards both buckets:
+    # it's assigned to the lower one here, and flagged as on_edge
+    # to be counted again in the one above.
+    nspeeds = speed_names.shape[0]
+    ws = station["ws"].to_numpy()
+    full_count = ws.shape[0]
+    in_range = (ws >= speed_lower[0]) & (ws <= speed_upper[-1])
+    ws = ws[in_range]
+    speeds = np.searchsorted(speed_upper, ws)
+    on_edge = np.isin(ws, speed_lower[1:])
+    wd = station["wd"].to_numpy()[in_range]
+
+    roses = []
+    # bin into three different petal count categories: 8pt, 16pt, and 36pt
+    for pcount, pcount_classes in direction_classes.items():
+        # Assign directions to bins: pcount equal sectors, each including
+        # its clockwise edge (e.g. (5º, 15º] for 36 petals), computed
+        # arithmetically. The sector centered on north (355º - 5º)
+        # wraps around, which would otherwise be annoying.
+        # Assign 0 to that direction class, which comes after the others.
+        ndirs = pcount_classes.shape[0]
+        width = 360 / pcount
+        directions = (np.ceil((wd - width / 2) / width).astype(int) - 1) % pcount
+
+        # counts for each direction class (rows) and speed range (columns),
+        # as a single 2d histogram over the flattened (direction, speed) cells
+        cells = directions * nspeeds + speeds
+        counts = np.bincount(
+            np.concatenate([cells, cells[on_edge] + 1]), minlength=ndirs * nspeeds
+        ).reshape(ndirs, nspeeds)
+        frequency = np.round(counts / max(full_count, 1) * 100, 2)
+
+        roses.append(
+            pd.DataFrame(
+                {
+                    "sid": station["sid"].values[0],
+                    "direction_class": np.repeat(pcount_classes, nspeeds),
+                    "speed_range": np.tile(speed_names, ndirs),
+                    "count": counts.ravel().astype(np.int32),
+                    "frequency": frequency.ravel().astype(np.float32),
+                    "decade": station["decade"].iloc[0],
+                    "pcount": pcount,
+                    "month": station["month"].iloc[0],
+                }
+            )
+        )
 
-    return accumulator
+    return pd.concat(roses, ignore_index=True)
 
 
 def adjust_sampling(station):
@@ -157,12 +192,17 @@ def adjust_sampling(station):
     # determine hour of year and split up by decade
     station["hour"] = station["ts"].dt.hour
     station["hoy"] = station["hour"] + (station["ts"].dt.dayofyear - 1) * 24
-    d1, d2 = [df for decade, df in station.groupby("decade")]
-    pval = ks_2samp(d1["hour"], d2["hour"])[1]
+    # the KS test is run on plain hour arrays split with a decade mask,
+    # rather than on frames copied out by a groupby on every test
+    d1_name = station["decade"].min()
+    hour = station["hour"].to_numpy()
+    is_d1 = station["decade"].to_numpy() == d1_name
+    pval = ks_2samp(hour[is_d1], hour[~is_d1])[1]
     # quick check just return station if no adjustment needed
     if pval >= 0.05:
-        station = station.drop(columns=["hour", "hoy"])
-        return station, station[station["decade"] == "cats"]  # empty dataframe
+        # empty frame shaped like the discarded observations returned below
+        rm_df = station.iloc[0:0].assign(iter=np.zeros(0, dtype=int)).set_index("ts")
+        return station.drop(columns=["hour", "hoy"]), rm_df
 
     # Now, iteratively remove observations systematically based on hour of year
     # the code below compares the frequencies of all hour-of-year, and
@@ -172,62 +212,56 @@ def adjust_sampling(station):
     # one of those 10 observations from decade 2 to remove.
     # Do this for all hours and re-test until passing.
 
-    # init empty data frame for timestamps to be removed
-    rm_df = station[station["decade"] == "cats"]
-    rm_df["iter"] = None  # column to store iteration number
-    station = station.set_index("ts")  # set ts indes for discarding obs
-    # create a data frame for filling in missing hours-of-year with zeros
+    # Observations are only marked as discarded by the iteration number they
+    # were removed in, and the station data and discarded observations are
+    # split once at the end, rather than copying both every iteration.
+    rm_iter = np.zeros(station.shape[0], dtype=int)
+    hoy = station["hoy"].to_numpy()
     # there are 366 * 24 = 8784 hour periods in a leap year
     n = 8784
-    hoy = np.arange(n)
-    d1_name, d2_name = station["decade"].unique()
-    hoy_df = pd.DataFrame(
-        {
-            "decade": np.concatenate([np.repeat(d1_name, n), np.repeat(d2_name, n)]),
-            "hoy": np.tile(hoy, 2),
-        }
-    )
     k = 1  # iter counter
     while pval < 0.05:
 
-        counts = (
-            station.groupby(["decade", "hoy"])["sid"]
-            .count()
-            .reset_index()
-            .rename(columns={"sid": "count"})
-        )
-        counts = counts.merge(hoy_df, on=["decade", "hoy"], how="outer").sort_values(
-            ["decade", "hoy"]
-        )
-        counts.loc[np.isnan(counts["count"]), "count"] = 0
-        d1_counts, d2_counts = [
-            df["count"].values for decade, df in counts.groupby("decade")
-        ]
-        d1_prune_hoy = np.argwhere(d1_counts - d2_counts > 0).flatten()
-        d2_prune_hoy = np.argwhere(d2_counts - d1_counts > 0).flatten()
-        d1_station, d2_station = [df for decade, df in station.groupby("decade")]
-        rm_ts = []
-        for i in d1_prune_hoy:
-            # random timestamp to drop
-            rm_ts.append(choice(d1_station[d1_station["hoy"] == i].index))
-        for i in d2_prune_hoy:
-            # random timestamp to drop
-            rm_ts.append(choice(d2_station[d2_station["hoy"] == i].index))
-
-        station = pd.concat([d1_station, d2_station])
-        temp_rm_df = station.loc[rm_ts].copy()
-        temp_rm_df["iter"] = k
+        # observation counts for every hour of year in each decade,
+        # including zeros for hours with no observations
+        keep = rm_iter == 0
+        d1_keep = keep & is_d1
+        d2_keep = keep & ~is_d1
+        d1_counts = np.bincount(hoy[d1_keep], minlength=n)
+        d2_counts = np.bincount(hoy[d2_keep], minlength=n)
+        d1_prune_hoy = np.flatnonzero(d1_counts > d2_counts)
+        d2_prune_hoy = np.flatnonzero(d2_counts > d1_counts)
+        # random observation to drop for each of those hours in each decade:
+        # with a decade's row positions sorted by hour of year, the rows for
+        # hour i are a run of counts[i] positions, starting after the rows
+        # for all earlier hours, so pick a random offset into each run
+        for decade_mask, counts, prune_hoy in [
+            (d1_keep, d1_counts, d1_prune_hoy),
+            (d2_keep, d2_counts, d2_prune_hoy),
+        ]:
+            positions = np.flatnonzero(decade_mask)
+            positions = positions[np.argsort(hoy[positions], kind="mergesort")]
+            starts = np.cumsum(counts) - counts
+            offsets = np.random.random_sample(prune_hoy.shape[0]) * counts[prune_hoy]
+            rm_iter[positions[starts[prune_hoy] + offsets.astype(int)]] = k
+
         k += 1
-        rm_df = pd.concat([rm_df, temp_rm_df])
-        station = station.drop(rm_ts)
         # re-test
-        d1, d2 = [df for decade, df in station.groupby("decade")]
-        pval = ks_2samp(d1["hour"], d2["hour"])[1]
+        keep = rm_iter == 0
+        pval = ks_2samp(hour[keep & is_d1], hour[keep & ~is_d1])[1]
+
+    discarded = rm_iter > 0
+    rm_df = (
+        station[discarded]
+        .assign(iter=rm_iter[discarded])
+        .sort_values("iter", kind="mergesort")
+        .set_index("ts")
+    )
 
-    return station.reset_index(), rm_df
+    return station[~discarded].reset_index(drop=True), rm_df
 
 
-def process_roses(stations, ncpus, roses_fp, discard_obs_fp):
+def process_roses(stations, pool, ncpus, roses_fp, discard_obs_fp):
     """
     For each station we need one trace for each direction.
 
@@ -245,6 +279,8 @@ def process_roses(stations, ncpus, roses_fp, discard_obs_fp):
 
     Args:
         stations (pandas.Dataframe): Processed raw station data
+        pool (multiprocessing.Pool): pool of workers to use, or None
+        ncpus (int): number of workers in the pool
 
     Returns:
         filepath where pre-processed wind rose data was saved
@@ -260,64 +296,86 @@ def process_roses(stations, ncpus, roses_fp, discard_obs_fp):
 
     # first process roses for all available stations - that is, stations
     # with data at least as old as 2010-01-01
-    min_ts = stations.groupby("sid")["ts"].min()
-    keep_sids = min_ts[min_ts < pd.to_datetime("2010-06-01")].index.values
+    min_ts = stations.groupby("sid", observed=True)["ts"].min()
+    keep_sids = min_ts[min_ts < summary_min_ts].index.values
     # stations to be used in the summary
     summary_stations = stations[stations["sid"].isin(keep_sids)].copy()
     # Set the decade column to "none" to indicate these are for all available data
     summary_stations["decade"] = "none"
-    # set month column to 0 for annual rose data
-    summary_stations["month"] = 0
     # drop calms for chunking to rose
     summary_stations = summary_stations[summary_stations["ws"] != 0].reset_index(
         drop=True
     )
 
-    # create summary rose data
+    # create summary rose data, with month set to 0 for annual rose data
     # break out into df by station for multithreading
-    station_dfs = [df for sid, df in summary_stations.groupby("sid")]
+    station_groups = (
+        summary_stations[rose_columns].assign(month=0).groupby("sid", observed=True)
+    )
 
-    with Pool(ncpus) as pool:
-        summary_roses = pd.concat(pool.map(chunk_to_rose, station_dfs))
+    summary_roses = pd.concat(
+        pool_imap(
+            pool,
+            chunk_to_rose,
+            (df for sid, df in station_groups),
+            get_chunksize(station_groups.ngroups, ncpus),
+        ),
+        ignore_index=True,
+    )
 
     print(f"Summary roses done, {round(time.perf_counter() - tic, 2)}s.")
     tic = time.perf_counter()
 
-    # now assign actual month, break up by month and station and re-process
-    summary_stations["month"] = summary_stations["ts"].dt.month
-    station_dfs = [df for items, df in summary_stations.groupby(["sid", "month"])]
+    # now use actual month, break up by month and station and re-process
+    station_groups = summary_stations[rose_columns].groupby(
+        ["sid", "month"], observed=True
+    )
 
-    with Pool(ncpus) as pool:
-        monthly_roses = pd.concat(pool.map(chunk_to_rose, station_dfs))
+    monthly_roses = pd.concat(
+        pool_imap(
+            pool,
+            chunk_to_rose,
+            (df for items, df in station_groups),
+            get_chunksize(station_groups.ngroups, ncpus),
+        ),
+        ignore_index=True,
+    )
 
     print(f"Monthly summary roses done, {round(time.perf_counter() - tic, 2)}s.")
     tic = time.perf_counter()
+    # free the summary data before building the comparison data
+    del summary_stations, station_groups
 
     # now focus on rose data for stations that will allow wind rose comparison
     # filter out stations where first obs is more recent than 1991-01-01
-    keep_sids = min_ts[min_ts < pd.to_datetime("1991-01-01")].index.values
+    keep_sids = min_ts[min_ts < compare_min_ts].index.values
     stations = stations[stations["sid"].isin(keep_sids)]
 
+    # check sufficient data for all stations at once, and keep the station
+    # data for only 2010s and the oldest decade available between 80s and 90s
+    compare_decades = find_comparison_decades(stations)
+    stations = stations[
+        pd.MultiIndex.from_frame(stations[["sid", "decade"]]).isin(compare_decades)
+    ]
+
     # break out into df by station for multithreading
     # add 0 for month column first
     stations["month"] = 0
-    station_dfs = [df for sid, df in stations.groupby("sid")]
-
-    # check sufficient data for each station, and return the station date for
-    # only 2010s and the oldest decade available between 80s and 90s
-    with Pool(ncpus) as pool:
-        compare_station_dfs = pool.map(
-            check_sufficient_comparison_rose_data, station_dfs
-        )
-
-    compare_station_dfs = [df for df in compare_station_dfs if df is not None]
+    # adjust_sampling also needs the timestamps
+    stations = stations[["ts"] + rose_columns]
+    compare_station_dfs = [df for sid, df in stations.groupby("sid", observed=True)]
+    # the per-station frames are copies, this filtered table isn't needed
+    del stations
 
     # now can discard observations to achieve sampling parity between decades
-    with Pool(ncpus) as pool:
-        adjustment_results = pool.map(adjust_sampling, compare_station_dfs)
+    # adjustment time varies a lot between stations, so hand them out singly
+    adjustment_results = list(pool_imap(pool, adjust_sampling, compare_station_dfs))
     # break up tuples of data/discarded data
     compare_station_dfs = [tup[0] for tup in adjustment_results]
     discarded_obs = pd.concat([tup[1] for tup in adjustment_results])
+    # drop these references so the adjusted frames can be freed once
+    # the calms are filtered out of them below
+    del adjustment_results
 
     print(
         f"Station data adjusted, chunking comparison roses, {round(time.perf_counter() - tic, 2)}s."
@@ -326,7 +384,8 @@ def process_roses(stations, ncpus, roses_fp, discard_obs_fp):
 
     # finally can chunk to rose for comparison roses - first filter out calms
     compare_station_dfs = [
-        df[df["ws"] != 0].reset_index(drop=True) for df in compare_station_dfs
+        df.loc[df["ws"] != 0, rose_columns].reset_index(drop=True)
+        for df in compare_station_dfs
     ]
     # then break up by decade for chunking to rose
     compare_station_dfs = [
@@ -335,10 +394,17 @@ def process_roses(stations, ncpus, roses_fp, discard_obs_fp):
         for decade, df in station.groupby("decade")
     ]
 
-    with Pool(ncpus) as pool:
-        compare_roses = pd.concat(pool.map(chunk_to_rose, compare_station_dfs))
+    compare_roses = pd.concat(
+        pool_imap(
+            pool,
+            chunk_to_rose,
+            compare_station_dfs,
+            get_chunksize(len(compare_station_dfs), ncpus),
+        ),
+        ignore_index=True,
+    )
 
-    roses = pd.concat([summary_roses, monthly_roses, compare_roses])
+    roses = pd.concat([summary_roses, monthly_roses, compare_roses], ignore_index=True)
 
     # concat and pickle it
     roses.to_pickle(roses_fp)
@@ -353,6 +419,25 @@ def process_roses(stations, ncpus, roses_fp, discard_obs_fp):
     return roses
 
 
+def count_calms(counts, by):
+    """Sum total and calm (zero wind speed) observation counts up to
+    coarser groups of station data
+
+    Args:
+        counts (pandas.DataFrame): total and calm observation counts by
+            sid, month and decade
+        by (list): names of columns to group by
+
+    Returns:
+        pandas.DataFrame of group keys with total and calm counts and
+        percent calm, for groups having at least one calm observation
+    """
+    calms = counts.groupby(by, observed=True)[["total", "calm"]].sum().reset_index()
+    calms = calms[calms["calm"] > 0]
+
+    return calms.assign(percent=round(calms["calm"] / calms["total"], 3) * 100)
+
+
 def process_calms(stations, roses, calms_fp):
     """
     For each station/year/month, generate a count
@@ -368,34 +453,25 @@ def process_calms(stations, roses, calms_fp):
     # drop gusts column, discard obs with NaN in direction or speed
     stations = stations.drop(columns="gust_mph").dropna()
 
+    # count total and calm observations by station, month and decade in a
+    # single pass over the data, the calms for each set of roses are summed
+    # from this small table
+    counts = (
+        stations.assign(calm=stations["ws"] == 0)
+        .groupby(["sid", "month", "decade"], observed=True)
+        .agg(total=("ws", "size"), calm=("calm", "sum"))
+        .reset_index()
+    )
+
     # first, process calms for all available stations
-    # Create temporary structure which holds
-    # total wind counts and counts where calm to compute
-    # % of calm measurements.
-    calms = stations.groupby("sid").size().reset_index()
-    # keep rows where speed == 0 (calm)
-    d = stations[(stations["ws"] == 0)]
-    d = d.groupby("sid").size().reset_index()
-    calms = calms.merge(d, on="sid")
-    calms.columns = ["sid", "total", "calm"]
-    calms = calms.assign(percent=round(calms["calm"] / calms["total"], 3) * 100)
+    calms = count_calms(counts, ["sid"])
     calms["decade"] = "none"
     calms["month"] = 0
     # re-order for concat below
     calms = calms[["sid", "month", "decade", "total", "calm", "percent"]]
 
     # next, process calms for all months for the same stations above
-    stations["month"] = stations["ts"].dt.month
-    monthly_calms = stations.groupby(["sid", "month"]).size().reset_index()
-
-    # keep rows where speed == 0 (calm)
-    d = stations[(stations["ws"] == 0)]
-    d = d.groupby(["sid", "month"]).size().reset_index()
-    monthly_calms = monthly_calms.merge(d, on=["sid", "month"])
-    monthly_calms.columns = ["sid", "month", "total", "calm"]
-    monthly_calms = monthly_calms.assign(
-        percent=round(monthly_calms["calm"] / monthly_calms["total"], 3) * 100
-    )
+    monthly_calms = count_calms(counts, ["sid", "month"])
     monthly_calms["decade"] = "none"
     # re-order for concat below
     monthly_calms = monthly_calms[
@@ -405,16 +481,8 @@ def process_calms(stations, roses, calms_fp):
     # repeat for comparison rose calms (include decade grouping)
     # filter stations to those with comparison rose data
     compare_sids = roses.loc[roses["decade"] == "2010-2019"]["sid"].unique()
-    stations = stations[stations["sid"].isin(compare_sids)]
-    compare_calms = stations.groupby(["sid", "decade"]).size().reset_index()
-    # keep rows where speed == 0 (calm)
-    compare_d = stations[(stations["ws"] == 0)]
-    compare_d = compare_d.groupby(["sid", "decade"]).size().reset_index()
-    compare_calms = compare_calms.merge(compare_d, on=["sid", "decade"])
-    compare_calms.columns = ["sid", "decade", "total", "calm"]
-    compare_calms = compare_calms.assign(
-        percent=round(compare_calms["calm"] / compare_calms["total"], 3) * 100
-    )
+    counts = counts[counts["sid"].isin(compare_sids)]
+    compare_calms = count_calms(counts, ["sid", "decade"])
     compare_calms["month"] = 0
     compare_calms = compare_calms[
         ["sid", "month", "decade", "total", "calm", "percent"]
@@ -424,8 +492,8 @@ def process_calms(stations, roses, calms_fp):
     calms = pd.concat([calms, monthly_calms, compare_calms])
 
     # remove remaining decades not present in station roses data
-    sid_decades = roses["sid"] + roses["decade"]
-    calms = calms[(calms["sid"] + calms["decade"]).isin(sid_decades)]
+    sid_decades = pd.MultiIndex.from_frame(roses[["sid", "decade"]]).unique()
+    calms = calms[pd.MultiIndex.from_frame(calms[["sid", "decade"]]).isin(sid_decades)]
     # pickle it
     calms.to_pickle(calms_fp)
 
@@ -437,42 +505,44 @@ def process_calms(stations, roses, calms_fp):
 
 def crosswind_component(ws, wd, d=0):
     """Compute crosswind component(s), ws and wd may be arrays"""
-    angles = ((wd - d) + 180) % 360 - 180
+    angles = ((np.asarray(wd, dtype=np.float64) - d) + 180) % 360 - 180
     return np.round(
-        np.array([abs(math.sin(math.radians(a)) * w) for a, w in zip(angles, ws)]), 2
+        np.abs(np.sin(np.deg2rad(angles)) * np.asarray(ws, dtype=np.float64)), 2
     )
 
 
-def exceedance_frequencies(winds, d, thresholds):
-    """Compute exceedance frequencies for given thresholds"""
-    crosswinds = crosswind_component(winds["ws"], winds["wd"], d)
-    n = crosswinds.shape[0]
-    return [
-        round((crosswinds > threshold).sum() / n, 4) * 100 for threshold in thresholds
-    ]
-
-
 def compute_exceedance(station, thresholds):
     """Compute exceedance frequencies for single station and set of thresholds"""
     directions = np.arange(0, 180, 10)
-    exceedance = [
-        exceedance_frequencies(station[["ws", "wd"]], d, thresholds) for d in directions
-    ]
-    exceedance = [
-        f for frequencies in exceedance for f in frequencies
-    ]  # unpack smal lists
+    # crosswind components for all directions at once, one column per direction
+    crosswinds = crosswind_component(
+        station["ws"].to_numpy()[:, None], station["wd"].to_numpy()[:, None], directions
+    )
+    n = crosswinds.shape[0]
+    # frequencies with one row per direction and one column per threshold
+    exceedance = (
+        np.round(
+            np.stack(
+                [(crosswinds > threshold).sum(axis=0) for threshold in thresholds],
+                axis=1,
+            )
+            / n,
+            4,
+        )
+        * 100
+    )
     return pd.DataFrame(
         {
             "sid": station["sid"].values[0],
             "direction": np.repeat(directions, thresholds.shape[0]),
             "threshold": np.tile(thresholds, directions.shape[0]),
             "rdc_class": np.tile(exceedance_classes, directions.shape[0]),
-            "exceedance": exceedance,
+            "exceedance": exceedance.ravel(),
         }
     )
 
 
-def process_crosswinds(stations, ncpus, exceedance_fp):
+def process_crosswinds(stations, pool, ncpus, exceedance_fp):
     """compute crosswind component frequencies"""
     print("Preprocessing allowable crosswind exceedance", end="...")
     tic = time.perf_counter()
@@ -480,17 +550,22 @@ def process_crosswinds(stations, ncpus, exceedance_fp):
     # drop gusts column, discard obs with NaN in direction or speed
     stations = stations.drop(columns="gust_mph").dropna()
     # filter out stations where first obs is younger than 2015-01-01
-    min_ts = stations.groupby("sid")["ts"].min()
-    keep_sids = min_ts[min_ts < pd.to_datetime("2015-01-01")].index.values
+    min_ts = stations.groupby("sid", observed=True)["ts"].min()
+    keep_sids = min_ts[min_ts < crosswind_min_ts].index.values
     stations = stations[stations["sid"].isin(keep_sids)]
 
     thresholds = np.round(np.array([10.5, 13, 16]) * 1.15078, 2)
     # compute exceedances in parallel for three thresholds
-    args = [(df, thresholds) for sid, df in stations.groupby("sid")]
-    with Pool(ncpus) as pool:
-        exceedance_dfs = pool.starmap(compute_exceedance, args)
-
-    exceedance = pd.concat(exceedance_dfs)
+    station_groups = stations[["sid", "ws", "wd"]].groupby("sid", observed=True)
+    exceedance = pd.concat(
+        pool_imap(
+            pool,
+            partial(compute_exceedance, thresholds=thresholds),
+            (df for sid, df in station_groups),
+            get_chunksize(station_groups.ngroups, ncpus),
+        ),
+        ignore_index=True,
+    )
     exceedance.to_pickle(exceedance_fp)
 
     print(f"done, {round(time.perf_counter() - tic, 2)}s")
@@ -506,16 +581,11 @@ def process_wep(stations, mean_wep_fp):
 
     # drop gusts column, discard obs with NaN in direction or speed
     stations = stations.drop(columns="gust_mph").dropna()
-    # filter out stations where first obs is younger than 2015-01-01
-    min_ts = stations.groupby("sid")["ts"].min()
-    keep_sids = min_ts[min_ts < pd.to_datetime("2015-01-01")].index.values
 
-    stations["month"] = stations["ts"].dt.month
-    stations["year"] = stations["ts"].dt.year
-
-    # first convert ws to m/s
-    stations["ws"] = stations["ws"].astype(np.float32) / 2.237
-    # adjust for height using the log-law: https://websites.pmc.ucsc.edu/~jnoble/wind/extrap/
+    # the speeds and energy are computed as arrays, rather than as new
+    # columns on (and copies of) the full station frame
+    # ws is converted to m/s, then adjusted for height using the log-law:
+    # https://websites.pmc.ucsc.edu/~jnoble/wind/extrap/
     # v ~ v_ref * log(z / z_0) / log(z_ref / z_0) where
     # z_0 = 0.5 (roughness length of 0.0005 for "airport" landscape type),
     # z_ref = 10, known speed height (10m)
@@ -524,17 +594,43 @@ def process_wep(stations, mean_wep_fp):
     z = 100
     z_ref = 10
     z_0 = 0.5
-    stations["ws"] = stations["ws"] * (np.log(z / z_0) / np.log(z_ref / z_0))
+    # both steps are a single scaling factor
+    ws_factor = np.float32(np.log(z / z_0) / np.log(z_ref / z_0) / 2.237)
     # compute wind energy potential using this:https://byjus.com/wind-energy-formula/
     # rho is air density constant
     rho = 1.23
-    stations["wep"] = 0.5 * rho * stations["ws"] ** 3
-    wep = stations.drop(columns=["ws", "wd"])
-    mean_wep = wep.groupby(["sid", "year", "month"]).mean().reset_index()
+    ws = stations["ws"].to_numpy(dtype=np.float32)
+    wep = np.float32(0.5 * rho) * (ws * ws_factor) ** 3
+
+    # mean wep by station, year and month: give every (sid, year, month)
+    # group one integer key, and sum and count the observations for all
+    # groups at once with bincount
+    sids = stations["sid"].cat.codes.to_numpy(dtype=np.int64)
+    years = stations["ts"].dt.year.to_numpy()
+    months = stations["month"].to_numpy(dtype=np.int64)
+    min_year = years.min()
+    nyears = years.max() - min_year + 1
+    keys = (sids * nyears + (years - min_year)) * 12 + (months - 1)
+    counts = np.bincount(keys)
+    sums = np.bincount(keys, weights=wep)
+    # unpack the keys of the groups with observations
+    group_keys = np.flatnonzero(counts)
+    group_sids, group_months = np.divmod(group_keys, 12)
+    group_sids, group_years = np.divmod(group_sids, nyears)
+    mean_wep = pd.DataFrame(
+        {
+            "sid": pd.Categorical.from_codes(
+                group_sids, stations["sid"].cat.categories
+            ),
+            "year": group_years + min_year,
+            "month": group_months + 1,
+            "wep": (sums[group_keys] / counts[group_keys]).astype(np.float32),
+        }
+    )
     mean_wep["wep"] = np.round(mean_wep["wep"])
     mean_wep = mean_wep.astype({"year": "int16", "month": "int16"})
     outlier_thresholds = (
-        mean_wep.groupby(["sid", "month"])["wep"]
+        mean_wep.groupby(["sid", "month"], observed=True)["wep"]
         .std()
         .reset_index()
         .rename(columns={"wep": "std"})
@@ -602,30 +698,47 @@ def main():
 
     base_dir = Path(os.getenv("BASE_DIR"))
 
-    # gather station data into single file
-    print("Reading data")
-    stations = pd.read_pickle(base_dir.joinpath("stations.pickle"))
-    # use the ws_adj column instead of ws
-    stations = stations.drop(columns="ws").rename(columns={"ws_adj": "ws"})
-
-    roses_fp = "data/roses.pickle"
-    if do_roses:
-        discard_obs_fp = base_dir.joinpath("discarded_comparison_obs.csv")
-        roses = process_roses(stations, ncpus, roses_fp, discard_obs_fp)
-
-    if do_calms:
-        calms_fp = "data/calms.pickle"
-        if not do_roses:
-            roses = pd.read_pickle(roses_fp)
-        calms = process_calms(stations, roses, calms_fp)
-
-    if do_crosswinds:
-        exceedance_fp = "data/crosswind_exceedance.pickle"
-        crosswinds = process_crosswinds(stations, ncpus, exceedance_fp)
-
-    if do_wep:
-        wep_quantiles_fp = "data/mean_wep.pickle"
-        wep = process_wep(stations, wep_quantiles_fp)
+    # one pool of workers is shared by all the steps that use one,
+    # there's no need for one if only using a single cpu.
+    # It is started before the station data is read: workers get all of
+    # their data as task arguments, so there's no reason for each forked
+    # worker to inherit a copy of the full stations table.
+    pool = Pool(ncpus) if ncpus > 1 else None
+    try:
+        # gather station data into single file
+        print("Reading data")
+        stations = pd.read_pickle(base_dir.joinpath("stations.pickle"))
+        # use the ws_adj column instead of ws
+        stations = stations.drop(columns="ws").rename(columns={"ws_adj": "ws"})
+        # categorical sid, so grouping by station works on integer codes and
+        # the station frames sent to the workers carry codes instead of strings.
+        # Groupbys on sid need observed=True to skip empty groups for stations
+        # that have been filtered out.
+        stations["sid"] = stations["sid"].astype("category")
+        # month is used by the roses, calms and wep steps, get it once here
+        stations["month"] = stations["ts"].dt.month.astype(np.int8)
+
+        roses_fp = "data/roses.pickle"
+        if do_roses:
+            discard_obs_fp = base_dir.joinpath("discarded_comparison_obs.csv")
+            roses = process_roses(stations, pool, ncpus, roses_fp, discard_obs_fp)
+
+        if do_calms:
+            calms_fp = "data/calms.pickle"
+            if not do_roses:
+                roses = pd.read_pickle(roses_fp)
+            calms = process_calms(stations, roses, calms_fp)
+
+        if do_crosswinds:
+            exceedance_fp = "data/crosswind_exceedance.pickle"
+            crosswinds = process_crosswinds(stations, pool, ncpus, exceedance_fp)
+
+        if do_wep:
+            wep_quantiles_fp = "data/mean_wep.pickle"
+            wep = process_wep(stations, wep_quantiles_fp)
+    finally:
+        if pool is not None:
+            pool.terminate()
 
 
 if __name__ == "__main__":